@@ -1,6 +1,7 @@
 import os
+import re
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Dict, FrozenSet, Optional, Tuple
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +24,35 @@ class Config:
     BOT_AUTO_ANSWER_PREFIX: str = os.getenv('BOT_AUTO_ANSWER_PREFIX', '.aans')
     BOT_MANUAL_ANSWER_PREFIX: str = os.getenv('BOT_MANUAL_ANSWER_PREFIX', '.mans')
     BOT_PREFERENCE_PREFIX: str = os.getenv('BOT_PREFERENCE_PREFIX', '.pref')
+
+    # Command type -> configured prefix, in matching precedence order
+    COMMAND_PREFIXES: Dict[str, str] = {
+        'question': BOT_COMMAND_PREFIX,
+        'answer': BOT_ANSWER_PREFIX,
+        'auto_answer': BOT_AUTO_ANSWER_PREFIX,
+        'manual_answer': BOT_MANUAL_ANSWER_PREFIX,
+        'preference': BOT_PREFERENCE_PREFIX,
+    }
+    # Derived once for the quick "could this be a command?" checks
+    COMMAND_PREFIXES_LOWER: Tuple[str, ...] = tuple(prefix.lower() for prefix in COMMAND_PREFIXES.values())
+    COMMAND_PREFIX_INITIALS: FrozenSet[str] = frozenset(prefix[:1] for prefix in COMMAND_PREFIXES_LOWER)
+    MIN_COMMAND_PREFIX_LENGTH: int = min(len(prefix) for prefix in COMMAND_PREFIXES_LOWER)
+    MAX_COMMAND_PREFIX_LENGTH: int = max(len(prefix) for prefix in COMMAND_PREFIXES_LOWER)
+    # Single alternation over all commands, matched against lowercased text.
+    # Each alternative is wrapped in a group named after its command type, so
+    # the outermost group (which closes last) is reported by ``match.lastgroup``.
+    # Payloads are preceded only by the prefix and whitespace, so their offsets
+    # in the lowercased text also hold in the original text.
+    COMMAND_PATTERN = re.compile(
+        rf'^(?:'
+        rf'(?P<question>{re.escape(BOT_COMMAND_PREFIX.lower())}\s+(?P<question_text>.+))'
+        rf'|(?P<answer>{re.escape(BOT_ANSWER_PREFIX.lower())}(?:\s+.*)?)'
+        rf'|(?P<auto_answer>{re.escape(BOT_AUTO_ANSWER_PREFIX.lower())}(?:\s+.*)?)'
+        rf'|(?P<manual_answer>{re.escape(BOT_MANUAL_ANSWER_PREFIX.lower())}(?:\s+.*)?)'
+        rf'|(?P<preference>{re.escape(BOT_PREFERENCE_PREFIX.lower())}(?:\s+(?P<preference_text>.*))?)'
+        rf')$',
+        re.DOTALL
+    )
     MAX_QUESTION_LENGTH: int = int(os.getenv('MAX_QUESTION_LENGTH', 500))
     RESPONSE_TIMEOUT: int = int(os.getenv('RESPONSE_TIMEOUT', 30))
 
@@ -23,6 +23,7 @@ from logger import setup_logger
 from telegram_client import TelegramBotClient
 from message_handler import MessageHandler
 from security import security_manager
+from preference_manager import preference_manager
 from error_handler import error_handler
 
 logger = setup_logger(__name__)
@@ -98,6 +99,9 @@ class TelegramAIBot:
             # Cleanup security data
             security_manager.cleanup_old_data()
             
+            # Write any pending preference changes
+            preference_manager.flush_preferences()
+            
             logger.info("Bot stopped successfully")
             
         except Exception as e:
@@ -1,5 +1,5 @@
 import asyncio
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set, Tuple
 from telethon.tl.types import Message, Chat, User, Channel
 from asyncio_throttle import Throttler
 from message_parser import MessageParser, ParsedCommand
@@ -33,8 +33,9 @@ class MessageHandler:
             period=Config.RATE_LIMIT_PERIOD
         )
 
-        # Track processing status
-        self.processing_messages = set()
+        # Track in-flight messages by (chat_id, message_id); message IDs are
+        # only unique per chat, and entries are dropped once processing ends
+        self.processing_messages: Set[Tuple[int, int]] = set()
     
     def set_owner_id(self, owner_id: int):
         """Set the owner ID after initialization.
@@ -57,6 +58,7 @@ class MessageHandler:
         """
         message = event.message
         message_id = message.id
+        message_key = (message.chat_id, message_id)
 
         # Security check: Only allow owner to use commands
         if self.owner_id and message.sender_id != self.owner_id:
@@ -64,11 +66,11 @@ class MessageHandler:
             return False
 
         # Prevent duplicate processing
-        if message_id in self.processing_messages:
+        if message_key in self.processing_messages:
             logger.debug(f"Message {message_id} already being processed")
             return False
 
-        self.processing_messages.add(message_id)
+        self.processing_messages.add(message_key)
         
         try:
             # Apply rate limiting
@@ -79,7 +81,7 @@ class MessageHandler:
             logger.error(f"Error handling message {message_id}: {e}")
             return False
         finally:
-            self.processing_messages.discard(message_id)
+            self.processing_messages.discard(message_key)
     
     async def _process_message(self, message: Message, question: str) -> bool:
         """Process a single message with AI response.
@@ -373,8 +375,20 @@ class MessageHandler:
         context = {}
         
         try:
+            # Fetch chat and sender concurrently; both are independent entity
+            # lookups and Telethon caches the results on the message. A failed
+            # lookup only drops its own fields instead of the whole context
+            chat, sender = await asyncio.gather(
+                message.get_chat(), message.get_sender(), return_exceptions=True
+            )
+            if isinstance(chat, Exception):
+                logger.warning(f"Error getting chat for message context: {chat}")
+                chat = None
+            if isinstance(sender, Exception):
+                logger.warning(f"Error getting sender for message context: {sender}")
+                sender = None
+
             # Get chat information
-            chat = await message.get_chat()
             if chat:
                 if isinstance(chat, (Chat, Channel)):
                     context['chat_title'] = getattr(chat, 'title', 'Unknown')
@@ -384,7 +398,6 @@ class MessageHandler:
                     context['chat_type'] = 'private'
             
             # Get sender information
-            sender = await message.get_sender()
             if sender and isinstance(sender, User):
                 context['user_name'] = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
                 if sender.username:
@@ -556,7 +569,7 @@ class MessageHandler:
                     auto_response_manager.record_skip(chat_id)
                     return True  # Consider this successful (no response needed)
 
-                # Get chat entity for typing simulation
+                # Chat entity was already resolved (and cached) while building the context
                 chat = await message.get_chat()
 
                 # Simulate typing for auto-response
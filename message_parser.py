@@ -6,7 +6,13 @@ from logger import setup_logger
 
 logger = setup_logger(__name__)
 
-@dataclass
+# Patterns that might indicate spam or abuse in a question
+_SUSPICIOUS_PATTERNS = (
+    re.compile(r'^(.)\1{10,}'),  # Repeated characters
+    re.compile(r'[^\w\s\?\!\.\,\-\(\)]{5,}'),  # Too many special characters
+)
+
+@dataclass(frozen=True)
 class ParsedCommand:
     """Represents a parsed command from a message."""
     original_text: str
@@ -17,52 +23,25 @@ class ParsedCommand:
     preferences: Optional[str] = None  # For .pref commands
     error_message: Optional[str] = None
 
+# Shared result for text that is not a command, the common case for chat
+# messages. ParsedCommand is frozen, so callers cannot change it for each
+# other; it does not carry the original text.
+_NOT_A_COMMAND = ParsedCommand(
+    original_text="",
+    command="",
+    command_type="",
+    question="",
+    preferences=None,
+    is_valid=False,
+    error_message="Message does not match any command pattern"
+)
+
 class MessageParser:
     """Parser for detecting and extracting commands from messages."""
     
     def __init__(self):
         """Initialize the message parser."""
-        self.command_prefix = Config.BOT_COMMAND_PREFIX
-        self.answer_prefix = Config.BOT_ANSWER_PREFIX
-        self.auto_answer_prefix = Config.BOT_AUTO_ANSWER_PREFIX
-        self.manual_answer_prefix = Config.BOT_MANUAL_ANSWER_PREFIX
-        self.preference_prefix = Config.BOT_PREFERENCE_PREFIX
         self.max_question_length = Config.MAX_QUESTION_LENGTH
-
-        # Create regex patterns for command detection
-        escaped_command_prefix = re.escape(self.command_prefix)
-        escaped_answer_prefix = re.escape(self.answer_prefix)
-        escaped_auto_answer_prefix = re.escape(self.auto_answer_prefix)
-        escaped_manual_answer_prefix = re.escape(self.manual_answer_prefix)
-        escaped_preference_prefix = re.escape(self.preference_prefix)
-
-        self.command_pattern = re.compile(
-            rf'^{escaped_command_prefix}\s+(.+)$',
-            re.IGNORECASE | re.DOTALL
-        )
-
-        self.answer_pattern = re.compile(
-            rf'^{escaped_answer_prefix}(?:\s+(.*))?$',
-            re.IGNORECASE | re.DOTALL
-        )
-
-        self.auto_answer_pattern = re.compile(
-            rf'^{escaped_auto_answer_prefix}(?:\s+(.*))?$',
-            re.IGNORECASE | re.DOTALL
-        )
-
-        self.manual_answer_pattern = re.compile(
-            rf'^{escaped_manual_answer_prefix}(?:\s+(.*))?$',
-            re.IGNORECASE | re.DOTALL
-        )
-
-        self.preference_pattern = re.compile(
-            rf'^{escaped_preference_prefix}(?:\s+(.*))?$',
-            re.IGNORECASE | re.DOTALL
-        )
-
-        # Pattern for cleaning up the question text
-        self.whitespace_pattern = re.compile(r'\s+')
         
     def parse_message(self, message_text: str) -> ParsedCommand:
         """Parse a message to extract command and question.
@@ -71,7 +50,8 @@ class MessageParser:
             message_text: The message text to parse
             
         Returns:
-            ParsedCommand: Parsed command information
+            ParsedCommand: Parsed command information (a shared, read-only
+                instance without ``original_text`` if the text is not a command)
         """
         if not message_text:
             return ParsedCommand(
@@ -87,52 +67,27 @@ class MessageParser:
         # Clean the message text
         cleaned_text = message_text.strip()
 
-        # Check if message matches command patterns
-        command_match = self.command_pattern.match(cleaned_text)
-        answer_match = self.answer_pattern.match(cleaned_text)
-        auto_answer_match = self.auto_answer_pattern.match(cleaned_text)
-        manual_answer_match = self.manual_answer_pattern.match(cleaned_text)
-        preference_match = self.preference_pattern.match(cleaned_text)
+        # Fast path: most messages do not start with any command prefix
+        if not self.is_command_message(cleaned_text):
+            return _NOT_A_COMMAND
+
+        # Check if message matches any command pattern
+        match = Config.COMMAND_PATTERN.match(cleaned_text.lower())
+        if not match:
+            return _NOT_A_COMMAND
 
+        command_type = match.lastgroup
+        command = Config.COMMAND_PREFIXES[command_type]
+        question = ""
         preferences = None
 
-        if command_match:
+        if command_type == "question":
             # .ascl <question> command
-            raw_question = command_match.group(1)
-            question = self._clean_question(raw_question)
-            command_type = "question"
-            command = self.command_prefix
-        elif answer_match:
-            # .ans command (no question needed)
-            question = ""
-            command_type = "answer"
-            command = self.answer_prefix
-        elif auto_answer_match:
-            # .aans command (enable auto-answering)
-            question = ""
-            command_type = "auto_answer"
-            command = self.auto_answer_prefix
-        elif manual_answer_match:
-            # .mans command (disable auto-answering)
-            question = ""
-            command_type = "manual_answer"
-            command = self.manual_answer_prefix
-        elif preference_match:
-            # .pref command (set preferences)
-            question = ""
-            command_type = "preference"
-            command = self.preference_prefix
-            preferences = preference_match.group(1) if preference_match.group(1) else ""
-        else:
-            return ParsedCommand(
-                original_text=message_text,
-                command="",
-                command_type="",
-                question="",
-                preferences=None,
-                is_valid=False,
-                error_message="Message does not match any command pattern"
-            )
+            question = self._clean_question(cleaned_text[match.start('question_text'):])
+        elif command_type == "preference":
+            # .pref command (set preferences), keeping the user's casing
+            preferences_start = match.start('preference_text')
+            preferences = cleaned_text[preferences_start:] if preferences_start != -1 else ""
         
         # Validate question (only for question commands)
         if command_type == "question":
@@ -166,13 +121,8 @@ class MessageParser:
         Returns:
             str: Cleaned question text
         """
-        # Remove excessive whitespace and normalize
-        cleaned = self.whitespace_pattern.sub(' ', raw_question.strip())
-        
-        # Remove common artifacts
-        cleaned = cleaned.replace('\n', ' ').replace('\r', ' ')
-        
-        return cleaned
+        # Collapse all whitespace runs (including newlines) into single spaces
+        return ' '.join(raw_question.split())
     
     def _validate_question(self, question: str) -> Optional[str]:
         """Validate the extracted question.
@@ -194,13 +144,8 @@ class MessageParser:
             return "Question too short"
         
         # Check for suspicious patterns that might indicate spam or abuse
-        suspicious_patterns = [
-            r'^(.)\1{10,}',  # Repeated characters
-            r'[^\w\s\?\!\.\,\-\(\)]{5,}',  # Too many special characters
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, question):
+        for pattern in _SUSPICIOUS_PATTERNS:
+            if pattern.search(question):
                 return "Question contains suspicious patterns"
         
         return None
@@ -217,12 +162,9 @@ class MessageParser:
         if not message_text:
             return False
 
-        text_lower = message_text.strip().lower()
-        return (text_lower.startswith(self.command_prefix.lower()) or
-                text_lower.startswith(self.answer_prefix.lower()) or
-                text_lower.startswith(self.auto_answer_prefix.lower()) or
-                text_lower.startswith(self.manual_answer_prefix.lower()) or
-                text_lower.startswith(self.preference_prefix.lower()))
+        # Only the leading characters can match a prefix, so avoid lowercasing the whole message
+        text_head = message_text.lstrip()[:Config.MAX_COMMAND_PREFIX_LENGTH].lower()
+        return text_head.startswith(Config.COMMAND_PREFIXES_LOWER)
     
     def extract_question_preview(self, question: str, max_length: int = 50) -> str:
         """Extract a preview of the question for logging.
@@ -1,16 +1,38 @@
+import asyncio
+import atexit
 import json
 import os
+import sqlite3
 import time
 from typing import Dict, List, Optional, Set
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from pathlib import Path
 from logger import setup_logger
 
+try:
+    import orjson
+except ImportError:  # optional speedup, fall back to the stdlib encoder
+    orjson = None
+
 logger = setup_logger(__name__)
 
+def _dumps(value) -> str:
+    """Serialize a value to a JSON string, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False)
+
+def _loads(data):
+    """Deserialize a JSON string or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 @dataclass
 class ChatPreferences:
     """Preferences for a specific chat."""
+    __slots__ = ('chat_id', 'preferences', 'created_at', 'updated_at')
+
     chat_id: int
     preferences: List[str]
     created_at: float
@@ -19,15 +41,32 @@ class ChatPreferences:
 class PreferenceManager:
     """Manages user preferences for different chats."""
     
-    def __init__(self, preferences_file: str = "preferences.json"):
+    def __init__(self, preferences_file: str = "preferences.db"):
         """Initialize the preference manager.
         
         Args:
-            preferences_file: File to store preferences
+            preferences_file: SQLite database to store preferences
         """
         self.preferences_file = Path(preferences_file)
+        # Legacy JSON store, imported once when the database is first created
+        self.legacy_preferences_file = self.preferences_file.with_suffix('.json')
+        # In-memory write-through cache, so reads never touch the database
         self.chat_preferences: Dict[int, ChatPreferences] = {}
+        
+        # Debounced writes: changed chats are flushed together after a short delay
+        self.flush_delay = 1.0
+        self._dirty_chats: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        try:
+            self.connection = self._connect(str(self.preferences_file))
+        except Exception as e:
+            # A read-only directory or a locked/corrupt database must not stop
+            # the bot from starting; keep preferences in memory for this run
+            logger.error("Error opening preferences database: %s", e)
+            self.connection = self._connect(":memory:")
         self.load_preferences()
+        atexit.register(self.flush_preferences)
         
         # Common preference examples for validation
         self.common_preferences = {
@@ -58,9 +97,9 @@ class PreferenceManager:
                 # Clear preferences if empty
                 if chat_id in self.chat_preferences:
                     del self.chat_preferences[chat_id]
-                    logger.info(f"Cleared preferences for chat {chat_id}")
+                    logger.info("Cleared preferences for chat %s", chat_id)
                 else:
-                    logger.info(f"No preferences to clear for chat {chat_id}")
+                    logger.info("No preferences to clear for chat %s", chat_id)
             else:
                 # Set new preferences
                 current_time = time.time()
@@ -69,7 +108,7 @@ class PreferenceManager:
                     # Update existing
                     self.chat_preferences[chat_id].preferences = preferences
                     self.chat_preferences[chat_id].updated_at = current_time
-                    logger.info(f"Updated preferences for chat {chat_id}: {preferences}")
+                    logger.info("Updated preferences for chat %s: %s", chat_id, preferences)
                 else:
                     # Create new
                     self.chat_preferences[chat_id] = ChatPreferences(
@@ -78,14 +117,14 @@ class PreferenceManager:
                         created_at=current_time,
                         updated_at=current_time
                     )
-                    logger.info(f"Set new preferences for chat {chat_id}: {preferences}")
+                    logger.info("Set new preferences for chat %s: %s", chat_id, preferences)
             
-            # Save to file
-            self.save_preferences()
+            # Persist only the affected chat, batched with other recent changes
+            self._mark_dirty(chat_id)
             return True
             
         except Exception as e:
-            logger.error(f"Error setting preferences for chat {chat_id}: {e}")
+            logger.error("Error setting preferences for chat %s: %s", chat_id, e)
             return False
     
     def get_preferences(self, chat_id: int) -> List[str]:
@@ -138,53 +177,187 @@ class PreferenceManager:
         if not preferences_text or not preferences_text.strip():
             return []
         
-        # Split by comma and clean up
-        preferences = []
-        for pref in preferences_text.split(','):
-            cleaned = pref.strip().lower()
-            if cleaned:
-                preferences.append(cleaned)
+        # Lowercase once, then split by comma and drop empty entries
+        return [pref for pref in (part.strip() for part in preferences_text.lower().split(',')) if pref]
+    
+    def _connect(self, database: str) -> sqlite3.Connection:
+        """Open the preferences database and make sure the schema exists.
         
-        return preferences
+        Args:
+            database: Path of the database file, or ":memory:"
+            
+        Returns:
+            sqlite3.Connection: Connection in autocommit mode with WAL enabled
+        """
+        connection = sqlite3.connect(database, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS prefs ("
+                "chat_id INTEGER PRIMARY KEY, "
+                "preferences TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+        except Exception:
+            connection.close()
+            raise
+        return connection
+    
+    def _row(self, prefs: ChatPreferences) -> tuple:
+        """Convert chat preferences to a database row.
+        
+        Args:
+            prefs: Chat preferences to convert
+            
+        Returns:
+            tuple: Row values in table column order
+        """
+        return (
+            prefs.chat_id,
+            _dumps(prefs.preferences),
+            prefs.created_at,
+            prefs.updated_at
+        )
+    
+    def _mark_dirty(self, chat_id: int):
+        """Schedule a chat's preferences to be written to the database.
+        
+        Args:
+            chat_id: Chat ID whose preferences changed
+        """
+        self._dirty_chats.add(chat_id)
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. scripts), write immediately
+            self.flush_preferences()
+            return
+        
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_after_delay())
+    
+    async def _flush_after_delay(self):
+        """Wait for the debounce delay, then flush all pending changes."""
+        await asyncio.sleep(self.flush_delay)
+        self.flush_preferences()
+    
+    def flush_preferences(self):
+        """Write all pending preference changes to the database in one transaction."""
+        if not self._dirty_chats:
+            return
+        
+        dirty_chats, self._dirty_chats = self._dirty_chats, set()
+        
+        try:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                for chat_id in dirty_chats:
+                    prefs = self.chat_preferences.get(chat_id)
+                    if prefs is None:
+                        self.connection.execute("DELETE FROM prefs WHERE chat_id = ?", (chat_id,))
+                    else:
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO prefs VALUES (?, ?, ?, ?)",
+                            self._row(prefs)
+                        )
+            
+            logger.debug("Preferences saved for %s chats", len(dirty_chats))
+            
+        except Exception as e:
+            logger.error("Error saving preferences: %s", e)
+            # Keep the changes pending so the next flush retries them
+            self._dirty_chats |= dirty_chats
     
     def load_preferences(self):
-        """Load preferences from file."""
+        """Load preferences from the database."""
         try:
-            if self.preferences_file.exists():
-                with open(self.preferences_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                for chat_id_str, pref_data in data.items():
-                    chat_id = int(chat_id_str)
-                    self.chat_preferences[chat_id] = ChatPreferences(
-                        chat_id=chat_id,
-                        preferences=pref_data['preferences'],
-                        created_at=pref_data.get('created_at', time.time()),
-                        updated_at=pref_data.get('updated_at', time.time())
-                    )
-                
-                logger.info(f"Loaded preferences for {len(self.chat_preferences)} chats")
+            rows = self.connection.execute(
+                "SELECT chat_id, preferences, created_at, updated_at FROM prefs"
+            ).fetchall()
+            
+            for chat_id, preferences, created_at, updated_at in rows:
+                self.chat_preferences[chat_id] = ChatPreferences(
+                    chat_id=chat_id,
+                    preferences=_loads(preferences),
+                    created_at=created_at,
+                    updated_at=updated_at
+                )
+            
+            # user_version 0 marks a database that has never been initialized
+            schema_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version == 0:
+                imported = True
+                if self.legacy_preferences_file.exists():
+                    imported = self._import_legacy_preferences()
+                if imported:
+                    self.connection.execute("PRAGMA user_version = 1")
+            
+            if self.chat_preferences:
+                logger.info("Loaded preferences for %s chats", len(self.chat_preferences))
             else:
-                logger.info("No preferences file found, starting fresh")
+                logger.info("No stored preferences found, starting fresh")
                 
         except Exception as e:
-            logger.error(f"Error loading preferences: {e}")
+            logger.error("Error loading preferences: %s", e)
             self.chat_preferences = {}
     
-    def save_preferences(self):
-        """Save preferences to file."""
+    def _import_legacy_preferences(self) -> bool:
+        """Import preferences from the legacy JSON file into the database.
+        
+        Returns:
+            bool: True if the import is done and should not be retried
+        """
+        try:
+            data = _loads(self.legacy_preferences_file.read_bytes())
+            legacy_preferences = {}
+            for chat_id_str, pref_data in data.items():
+                chat_id = int(chat_id_str)
+                legacy_preferences[chat_id] = ChatPreferences(
+                    chat_id=chat_id,
+                    preferences=pref_data['preferences'],
+                    created_at=pref_data.get('created_at', time.time()),
+                    updated_at=pref_data.get('updated_at', time.time())
+                )
+        except Exception as e:
+            # A corrupt legacy file can never be imported; keep the database
+            # rows and don't try again on the next start
+            logger.error("Error importing legacy preferences from %s: %s", self.legacy_preferences_file, e)
+            return True
+        
+        self.chat_preferences.update(legacy_preferences)
+        if not self.save_preferences():
+            # Leave the import pending so it is retried on the next start
+            return False
+        
+        logger.info("Imported preferences for %s chats from %s", len(legacy_preferences), self.legacy_preferences_file)
+        return True
+    
+    def save_preferences(self) -> bool:
+        """Save all preferences to the database in a single transaction.
+        
+        Returns:
+            bool: True if preferences were saved successfully
+        """
+        self._dirty_chats = set()
+        
         try:
-            data = {}
-            for chat_id, prefs in self.chat_preferences.items():
-                data[str(chat_id)] = asdict(prefs)
-            
-            with open(self.preferences_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute("DELETE FROM prefs")
+                self.connection.executemany(
+                    "INSERT INTO prefs VALUES (?, ?, ?, ?)",
+                    [self._row(prefs) for prefs in self.chat_preferences.values()]
+                )
             
-            logger.debug("Preferences saved to file")
+            logger.debug("Preferences saved to database")
+            return True
             
         except Exception as e:
-            logger.error(f"Error saving preferences: {e}")
+            logger.error("Error saving preferences: %s", e)
+            return False
     
     def get_all_preferences(self) -> Dict[int, List[str]]:
         """Get all preferences for all chats.
@@ -211,11 +384,16 @@ class PreferenceManager:
                 del self.chat_preferences[chat_id]
             
             if old_chats:
-                logger.info(f"Cleaned up preferences for {len(old_chats)} old chats")
-                self.save_preferences()
+                with self.connection:
+                    self.connection.execute("BEGIN")
+                    self.connection.executemany(
+                        "DELETE FROM prefs WHERE chat_id = ?",
+                        [(chat_id,) for chat_id in old_chats]
+                    )
+                logger.info("Cleaned up preferences for %s old chats", len(old_chats))
                 
         except Exception as e:
-            logger.error(f"Error cleaning up preferences: {e}")
+            logger.error("Error cleaning up preferences: %s", e)
 
 # Global preference manager instance
 preference_manager = PreferenceManager()
@@ -1,14 +1,71 @@
 import os
+import re
+import logging
+import bisect
+import functools
 import hashlib
+import math
 import time
-from typing import Dict, Set, Optional, List
+from typing import Dict, Optional, List
 from dataclasses import dataclass, field
-from collections import defaultdict, deque
+from collections import OrderedDict, deque
 from config import Config
 from logger import setup_logger
 
 logger = setup_logger(__name__)
 
+_NON_WORD_RE = re.compile(r'[^\w]')
+
+@functools.lru_cache(maxsize=16384)
+def _derive_user_id(telegram_user_id: int, chat_id: int) -> str:
+    """Hash a (user, chat) pair into a 16-character identifier, memoized per pair."""
+    # BLAKE2b with an 8-byte digest yields the 16 hex chars directly
+    identifier = f"{telegram_user_id}:{chat_id}"
+    return hashlib.blake2b(identifier.encode(), digest_size=8).hexdigest()
+
+class HyperLogLog:
+    """Fixed-memory approximate counter of distinct strings.
+    
+    With the default precision of 12 it uses 4096 one-byte registers and has
+    a typical relative error of about 1.6%.
+    """
+    
+    def __init__(self, precision: int = 12):
+        """Initialize the counter.
+        
+        Args:
+            precision: Number of hash bits used to select a register
+        """
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+        self.alpha = 0.7213 / (1 + 1.079 / self.register_count)
+    
+    def add(self, item: str):
+        """Add an item to the counter.
+        
+        Args:
+            item: Item to count
+        """
+        value = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+        index = value & (self.register_count - 1)
+        remaining = value >> self.precision
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def __len__(self) -> int:
+        """Estimate the number of distinct items added."""
+        m = self.register_count
+        estimate = self.alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        
+        # Small-range correction: linear counting on empty registers
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * m and empty_registers:
+            estimate = m * math.log(m / empty_registers)
+        
+        return int(round(estimate))
+
 @dataclass
 class SecurityMetrics:
     """Security metrics for monitoring bot usage."""
@@ -16,7 +73,7 @@ class SecurityMetrics:
     failed_requests: int = 0
     rate_limited_requests: int = 0
     blocked_requests: int = 0
-    unique_users: Set[str] = field(default_factory=set)
+    unique_users: HyperLogLog = field(default_factory=HyperLogLog)  # Approximate, fixed memory
     start_time: float = field(default_factory=time.time)
 
 class SecurityManager:
@@ -26,32 +83,49 @@ class SecurityManager:
         """Initialize the security manager."""
         self.metrics = SecurityMetrics()
         
-        # Rate limiting per user
-        self.user_request_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
+        # Rate limiting per user: time.monotonic() request timestamps in
+        # ascending order, created on a user's first request. Rate-limit
+        # windows and blocks use the monotonic clock so wall-clock jumps
+        # cannot shorten or extend them. Users are kept in least-recently-
+        # active order so inactive ones can be evicted from the front.
+        self.user_request_history: "OrderedDict[str, List[float]]" = OrderedDict()
         self.user_blocked_until: Dict[str, float] = {}
         
         # Global rate limiting
         self.global_request_history = deque(maxlen=1000)
         
-        # Suspicious pattern detection
-        self.suspicious_patterns = [
-            r'(.)\1{20,}',  # Repeated characters
-            r'[^\w\s]{10,}',  # Too many special characters
-            r'\b(test|spam|flood)\b.*\1.*\1',  # Repeated spam words
-        ]
+        # Suspicious pattern detection, one named alternative per check.
+        # Backreferences use named groups so they stay valid inside the union.
+        self.suspicious_pattern = re.compile('|'.join([
+            r'(?P<repeated_characters>(?P<char>.)(?P=char){20,})',
+            r'(?P<special_characters>[^\w\s]{10,})',
+            r'(?P<repeated_spam_words>\b(?P<spam_word>test|spam|flood)\b.*(?P=spam_word).*(?P=spam_word))',
+        ]))
         
         # Blocked content patterns
-        self.blocked_patterns = [
-            r'(?i)(hack|crack|exploit|ddos|attack)',
-            r'(?i)(password|credit.*card|ssn|social.*security)',
-            r'(?i)(illegal|drugs|weapons|bomb)',
-        ]
+        self.blocked_pattern = re.compile('|'.join([
+            r'(?P<attacks>hack|crack|exploit|ddos|attack)',
+            r'(?P<sensitive_data>password|credit.*card|ssn|social.*security)',
+            r'(?P<illegal_content>illegal|drugs|weapons|bomb)',
+        ]), re.IGNORECASE)
+        
+        # Literal keywords that every blocked pattern requires, used to skip
+        # the regex for the common case of a benign question
+        self.blocked_keywords = (
+            'hack', 'crack', 'exploit', 'ddos', 'attack',
+            'password', 'credit', 'ssn', 'social',
+            'illegal', 'drugs', 'weapons', 'bomb',
+        )
         
         # Configuration
         self.max_requests_per_minute = Config.RATE_LIMIT_REQUESTS
         self.rate_limit_window = Config.RATE_LIMIT_PERIOD
         self.max_question_length = Config.MAX_QUESTION_LENGTH
         self.block_duration = 300  # 5 minutes
+        self.inactive_user_timeout = 3600  # Forget users idle for 1 hour
+        self.max_tracked_users = 10000
+        self.cleanup_interval = 1024  # Evict inactive users every N accepted requests
+        self._accepted_requests = 0
         
     def check_rate_limit(self, user_id: str) -> bool:
         """Check if user is within rate limits.
@@ -62,12 +136,13 @@ class SecurityManager:
         Returns:
             bool: True if request is allowed, False if rate limited
         """
-        current_time = time.time()
+        current_time = time.monotonic()
         
         # Check if user is currently blocked
         if user_id in self.user_blocked_until:
             if current_time < self.user_blocked_until[user_id]:
-                logger.warning(f"User {user_id} is blocked until {self.user_blocked_until[user_id]}")
+                remaining = self.user_blocked_until[user_id] - current_time
+                logger.warning("User %s is blocked for another %.0f seconds", user_id, remaining)
                 self.metrics.blocked_requests += 1
                 return False
             else:
@@ -75,33 +150,45 @@ class SecurityManager:
                 del self.user_blocked_until[user_id]
         
         # Get user's request history
-        user_history = self.user_request_history[user_id]
-        
-        # Remove old requests outside the window
-        cutoff_time = current_time - self.rate_limit_window
-        while user_history and user_history[0] < cutoff_time:
-            user_history.popleft()
+        user_history = self.user_request_history.get(user_id)
+        if user_history is None:
+            # First request from this user, nothing to expire
+            user_history = []
+        else:
+            # Remove old requests outside the window (history is sorted, so one slice delete)
+            cutoff_time = current_time - self.rate_limit_window
+            expired = bisect.bisect_left(user_history, cutoff_time)
+            if expired:
+                del user_history[:expired]
         
         # Check if user exceeds rate limit
         if len(user_history) >= self.max_requests_per_minute:
-            logger.warning(f"User {user_id} exceeded rate limit ({len(user_history)} requests)")
+            logger.warning("User %s exceeded rate limit (%s requests)", user_id, len(user_history))
             self.metrics.rate_limited_requests += 1
             
             # Block user for repeated violations
             if len(user_history) >= self.max_requests_per_minute * 2:
                 self.user_blocked_until[user_id] = current_time + self.block_duration
-                logger.warning(f"User {user_id} blocked for {self.block_duration} seconds")
+                logger.warning("User %s blocked for %s seconds", user_id, self.block_duration)
             
             return False
         
-        # Add current request to history
+        # Add current request to history and mark the user most recently active
+        if not user_history:
+            self.user_request_history[user_id] = user_history
         user_history.append(current_time)
+        self.user_request_history.move_to_end(user_id)
         self.global_request_history.append(current_time)
         
         # Update metrics
         self.metrics.total_requests += 1
         self.metrics.unique_users.add(user_id)
         
+        # Amortized cleanup instead of relying on an external trigger
+        self._accepted_requests += 1
+        if self._accepted_requests % self.cleanup_interval == 0:
+            self._evict_inactive_users(current_time)
+        
         return True
     
     def validate_question(self, question: str, user_id: str) -> Optional[str]:
@@ -117,32 +204,35 @@ class SecurityManager:
         try:
             # Length check
             if len(question) > self.max_question_length:
-                logger.warning(f"User {user_id} submitted question too long: {len(question)} chars")
+                logger.warning("User %s submitted question too long: %s chars", user_id, len(question))
                 return f"Question too long ({len(question)} chars, max {self.max_question_length})"
             
             # Check for blocked content
-            import re
-            for pattern in self.blocked_patterns:
-                if re.search(pattern, question):
-                    logger.warning(f"User {user_id} submitted blocked content: {pattern}")
+            # Non-ASCII text always goes through the regex, since its case
+            # folding is not the same as str.lower()
+            question_lower = question.lower()
+            if not question.isascii() or any(keyword in question_lower for keyword in self.blocked_keywords):
+                match = self.blocked_pattern.search(question)
+                if match:
+                    logger.warning("User %s submitted blocked content: %s", user_id, match.lastgroup)
                     self.metrics.blocked_requests += 1
                     return "Question contains prohibited content"
             
             # Check for suspicious patterns
-            for pattern in self.suspicious_patterns:
-                if re.search(pattern, question):
-                    logger.warning(f"User {user_id} submitted suspicious content: {pattern}")
-                    return "Question contains suspicious patterns"
+            match = self.suspicious_pattern.search(question)
+            if match:
+                logger.warning("User %s submitted suspicious content: %s", user_id, match.lastgroup)
+                return "Question contains suspicious patterns"
             
             # Check for minimum meaningful content
-            meaningful_chars = len(re.sub(r'[^\w]', '', question))
+            meaningful_chars = len(_NON_WORD_RE.sub('', question))
             if meaningful_chars < 3:
                 return "Question too short or contains no meaningful content"
             
             return None
             
         except Exception as e:
-            logger.error(f"Error validating question: {e}")
+            logger.error("Error validating question: %s", e)
             return "Error validating question"
     
     def get_user_id(self, telegram_user_id: int, chat_id: int) -> str:
@@ -156,8 +246,7 @@ class SecurityManager:
             str: Hashed user identifier
         """
         # Create a hash that includes both user and chat for privacy
-        identifier = f"{telegram_user_id}:{chat_id}"
-        return hashlib.sha256(identifier.encode()).hexdigest()[:16]
+        return _derive_user_id(telegram_user_id, chat_id)
     
     def check_global_rate_limit(self) -> bool:
         """Check global rate limiting to prevent system overload.
@@ -165,7 +254,7 @@ class SecurityManager:
         Returns:
             bool: True if request is allowed, False if globally rate limited
         """
-        current_time = time.time()
+        current_time = time.monotonic()
         cutoff_time = current_time - 60  # 1 minute window
         
         # Remove old requests
@@ -175,7 +264,7 @@ class SecurityManager:
         # Check global limit (e.g., 100 requests per minute across all users)
         global_limit = 100
         if len(self.global_request_history) >= global_limit:
-            logger.warning(f"Global rate limit exceeded: {len(self.global_request_history)} requests")
+            logger.warning("Global rate limit exceeded: %s requests", len(self.global_request_history))
             return False
         
         return True
@@ -188,6 +277,10 @@ class SecurityManager:
             user_id: User identifier
             details: Additional event details
         """
+        # Skip building the entry when warnings are filtered out
+        if not logger.isEnabledFor(logging.WARNING):
+            return
+        
         try:
             log_entry = {
                 'event_type': event_type,
@@ -195,9 +288,9 @@ class SecurityManager:
                 'timestamp': time.time(),
                 **details
             }
-            logger.warning(f"Security event: {log_entry}")
+            logger.warning("Security event: %s", log_entry)
         except Exception as e:
-            logger.error(f"Error logging security event: {e}")
+            logger.error("Error logging security event: %s", e)
     
     def get_security_stats(self) -> Dict:
         """Get security statistics.
@@ -205,8 +298,9 @@ class SecurityManager:
         Returns:
             Dict: Security metrics and statistics
         """
-        current_time = time.time()
-        uptime = current_time - self.metrics.start_time
+        uptime = time.time() - self.metrics.start_time
+        # Request timestamps come from the monotonic clock
+        active_cutoff = time.monotonic() - 3600
         
         return {
             'uptime_seconds': uptime,
@@ -217,15 +311,15 @@ class SecurityManager:
             'unique_users': len(self.metrics.unique_users),
             'requests_per_hour': (self.metrics.total_requests / uptime * 3600) if uptime > 0 else 0,
             'currently_blocked_users': len(self.user_blocked_until),
-            'active_users_last_hour': len([
-                user_id for user_id, history in self.user_request_history.items()
-                if history and history[-1] > current_time - 3600
-            ])
+            'active_users_last_hour': sum(
+                1 for history in self.user_request_history.values()
+                if history and history[-1] > active_cutoff
+            )
         }
     
     def cleanup_old_data(self):
         """Clean up old security data to prevent memory leaks."""
-        current_time = time.time()
+        current_time = time.monotonic()
         
         # Remove old blocked users
         expired_blocks = [
@@ -236,14 +330,35 @@ class SecurityManager:
             del self.user_blocked_until[user_id]
         
         # Remove inactive user histories (older than 1 hour)
-        inactive_users = [
-            user_id for user_id, history in self.user_request_history.items()
-            if not history or history[-1] < current_time - 3600
-        ]
-        for user_id in inactive_users:
-            del self.user_request_history[user_id]
+        inactive_users = self._evict_inactive_users(current_time)
+        
+        logger.debug("Cleaned up %s expired blocks and %s inactive users", len(expired_blocks), inactive_users)
+    
+    def _evict_inactive_users(self, current_time: float) -> int:
+        """Drop the least recently active user histories.
+        
+        Users are evicted while they have been idle longer than the inactivity
+        timeout, or while more than ``max_tracked_users`` are tracked. Since the
+        histories are ordered by last activity, this only touches evicted entries.
+        
+        Args:
+            current_time: Current monotonic time
+            
+        Returns:
+            int: Number of evicted users
+        """
+        cutoff_time = current_time - self.inactive_user_timeout
+        history = self.user_request_history
+        evicted = 0
+        
+        while history:
+            user_id, timestamps = next(iter(history.items()))
+            if len(history) <= self.max_tracked_users and timestamps and timestamps[-1] >= cutoff_time:
+                break
+            history.popitem(last=False)
+            evicted += 1
         
-        logger.debug(f"Cleaned up {len(expired_blocks)} expired blocks and {len(inactive_users)} inactive users")
+        return evicted
 
 # Global security manager instance
 security_manager = SecurityManager()
@@ -4,26 +4,93 @@ ASCL Security Manager
 Handles security, isolation, and privacy measures for multi-tenant hosting.
 """
 
+import asyncio
+import functools
 import os
+import re
+import base64
 import logging
-import hashlib
 import secrets
+import shutil
+import time
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 import subprocess
 import psutil
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import json
 
+try:
+    import orjson
+except ImportError:  # optional speedup, fall back to the stdlib encoder
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+_now = time.time  # Wall-clock timestamps recorded in manifests and reports
+
+# Encrypted payload format: version byte + 12-byte nonce + AES-GCM ciphertext/tag.
+# Legacy Fernet tokens start with 0x80 and are still accepted for decryption.
+AEAD_FORMAT_VERSION = b'\x01'
+AEAD_NONCE_SIZE = 12
+
+# E.164 phone number: leading +, no leading zero, up to 15 digits
+_PHONE_RE = re.compile(r'^\+[1-9]\d{1,14}$')
+
+# Placeholder values that show up in copied example configs
+_FAKE_CRED_RE = re.compile(r'your_api|example|test|fake|demo', re.IGNORECASE)
+
+# Shell metacharacters stripped from user input
+_SANITIZE_TABLE = str.maketrans('', '', '`$|&;><(){}')
+
+# Secure deletion overwrites files in chunks of this size
+OVERWRITE_CHUNK_SIZE = 1 << 20
+
+@functools.lru_cache(maxsize=4096)
+def _user_path(user_id: int) -> Path:
+    """Return the instance directory of a hosted user."""
+    return Path("user_instances") / f"user_{user_id}"
+
+def _walk_files(root) -> Iterator[os.DirEntry]:
+    """Yield every regular file below root, without following symlinks."""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+def _count_entries(directory, suffix: str = "") -> int:
+    """Count the direct entries of a directory whose name ends with suffix."""
+    try:
+        with os.scandir(directory) as entries:
+            return sum(1 for entry in entries if entry.name.endswith(suffix))
+    except FileNotFoundError:
+        return 0
+
 class SecurityManager:
     """Manages security and isolation for user instances."""
     
     def __init__(self):
         self.encryption_key = self._get_or_create_encryption_key()
-        self.cipher = Fernet(self.encryption_key)
+        self.cipher = Fernet(self.encryption_key)  # Decrypts legacy Fernet tokens
+        self.aead = AESGCM(self._derive_aead_key(self.encryption_key))
         self.user_processes: Dict[int, Dict[str, Any]] = {}
+        
+        # Resource limits checked on every monitoring tick
+        self.max_memory_mb = 512
+        self.max_cpu_percent = 25
+        self.max_open_files = 100
+        self.max_network_connections = 50
+        
+        # Open files and connections are expensive to list (one readlink per
+        # fd, full socket table parse), so they are refreshed less often
+        self.fd_check_interval = 30  # seconds
+        # user_id -> (process_id, monotonic time of the last fd/connection check)
+        self._fd_checked_at: Dict[int, Tuple[int, float]] = {}
     
     def _get_or_create_encryption_key(self) -> bytes:
         """Get or create encryption key for sensitive data."""
@@ -40,17 +107,44 @@ class SecurityManager:
             os.chmod(key_file, 0o600)  # Read-only for owner
             return key
     
+    def _derive_aead_key(self, encryption_key: bytes) -> bytes:
+        """Derive a dedicated AES-256-GCM key from the stored Fernet key."""
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"ascl-aes-gcm-v1"
+        ).derive(base64.urlsafe_b64decode(encryption_key))
+    
     def encrypt_sensitive_data(self, data: str) -> str:
-        """Encrypt sensitive data like API keys."""
-        return self.cipher.encrypt(data.encode()).decode()
+        """Encrypt sensitive data like API keys with AES-GCM."""
+        nonce = os.urandom(AEAD_NONCE_SIZE)
+        token = AEAD_FORMAT_VERSION + nonce + self.aead.encrypt(nonce, data.encode(), None)
+        return base64.urlsafe_b64encode(token).decode()
+    
+    def encrypt_many(self, items: List[str]) -> List[str]:
+        """Encrypt several values at once, sharing one random read for all nonces."""
+        nonces = os.urandom(AEAD_NONCE_SIZE * len(items))
+        encrypt = self.aead.encrypt
+        
+        encrypted = []
+        for index, data in enumerate(items):
+            nonce = nonces[index * AEAD_NONCE_SIZE:(index + 1) * AEAD_NONCE_SIZE]
+            token = AEAD_FORMAT_VERSION + nonce + encrypt(nonce, data.encode(), None)
+            encrypted.append(base64.urlsafe_b64encode(token).decode())
+        return encrypted
     
     def decrypt_sensitive_data(self, encrypted_data: str) -> str:
-        """Decrypt sensitive data."""
+        """Decrypt sensitive data (AES-GCM or legacy Fernet tokens)."""
+        token = base64.urlsafe_b64decode(encrypted_data.encode())
+        if token[:1] == AEAD_FORMAT_VERSION:
+            nonce = token[1:1 + AEAD_NONCE_SIZE]
+            return self.aead.decrypt(nonce, token[1 + AEAD_NONCE_SIZE:], None).decode()
         return self.cipher.decrypt(encrypted_data.encode()).decode()
     
     def create_secure_user_environment(self, user_id: int) -> Dict[str, str]:
         """Create secure isolated environment for user."""
-        user_path = Path(f"user_instances/user_{user_id}")
+        user_path = _user_path(user_id)
         
         # Create directory structure with proper permissions
         directories = [
@@ -61,29 +155,36 @@ class SecurityManager:
             user_path / "temp"
         ]
         
+        # mkdir applies the owner-only mode itself (umask can only narrow it);
+        # only directories that already existed need an explicit chmod
+        user_path.parent.mkdir(parents=True, exist_ok=True)
         for directory in directories:
-            directory.mkdir(parents=True, exist_ok=True)
-            os.chmod(directory, 0o700)  # Owner only
+            try:
+                directory.mkdir(mode=0o700)
+            except FileExistsError:
+                os.chmod(directory, 0o700)  # Owner only
         
         # Create security manifest
         security_manifest = {
             "user_id": user_id,
-            "created_at": os.time.time(),
+            "created_at": _now(),
             "permissions": {
                 "network_access": True,
                 "file_system_access": "restricted",
                 "process_isolation": True
             },
             "resource_limits": {
-                "max_memory_mb": 512,
-                "max_cpu_percent": 25,
+                "max_memory_mb": self.max_memory_mb,
+                "max_cpu_percent": self.max_cpu_percent,
                 "max_disk_mb": 1024
             }
         }
         
         manifest_file = user_path / "security_manifest.json"
-        with open(manifest_file, 'w') as f:
-            json.dump(security_manifest, f, indent=2)
+        if orjson is not None:
+            manifest_file.write_bytes(orjson.dumps(security_manifest, option=orjson.OPT_INDENT_2))
+        else:
+            manifest_file.write_text(json.dumps(security_manifest, indent=2))
         os.chmod(manifest_file, 0o600)
         
         return {
@@ -93,55 +194,54 @@ class SecurityManager:
     
     def sanitize_user_input(self, user_input: str) -> str:
         """Sanitize user input to prevent injection attacks."""
-        # Remove potentially dangerous characters
-        dangerous_chars = ['`', '$', '|', '&', ';', '>', '<', '(', ')', '{', '}']
-        sanitized = user_input
-        
-        for char in dangerous_chars:
-            sanitized = sanitized.replace(char, '')
-        
-        # Limit length
-        return sanitized[:1000]
+        # Remove potentially dangerous characters in a single pass, then limit length
+        return user_input.translate(_SANITIZE_TABLE)[:1000]
     
     def validate_phone_number(self, phone: str) -> bool:
         """Validate phone number format."""
-        import re
-        # Basic phone number validation
-        pattern = r'^\+[1-9]\d{1,14}$'
-        return bool(re.match(pattern, phone))
+        return bool(_PHONE_RE.match(phone))
     
     def generate_secure_session_id(self, user_id: int) -> str:
         """Generate secure session ID."""
-        random_data = secrets.token_bytes(32)
-        user_data = str(user_id).encode()
-        timestamp = str(int(os.time.time())).encode()
-        
-        combined = random_data + user_data + timestamp
-        return hashlib.sha256(combined).hexdigest()
+        # All of the entropy comes from the random bytes; hashing them together
+        # with the user ID and time added nothing, so return them directly
+        return secrets.token_hex(32)
     
     def monitor_user_process(self, user_id: int, process_id: int) -> Dict[str, Any]:
         """Monitor user process for resource usage and security."""
         try:
             process = psutil.Process(process_id)
             
-            # Get resource usage
-            memory_info = process.memory_info()
-            cpu_percent = process.cpu_percent()
-            
-            # Check if process is still running
-            is_running = process.is_running()
+            # oneshot() reads each /proc file once for all the queries below
+            with process.oneshot():
+                # Get resource usage
+                memory_info = process.memory_info()
+                cpu_percent = process.cpu_percent()
+                
+                # Check if process is still running
+                is_running = process.is_running()
             
-            # Get open files (for security monitoring)
-            try:
-                open_files = len(process.open_files())
-            except (psutil.AccessDenied, psutil.NoSuchProcess):
-                open_files = 0
-            
-            # Get network connections
-            try:
-                connections = len(process.connections())
-            except (psutil.AccessDenied, psutil.NoSuchProcess):
-                connections = 0
+            # Reuse the last file and connection counts while they are fresh
+            check_time = time.monotonic()
+            previous = self.user_processes.get(user_id)
+            last_check = self._fd_checked_at.get(user_id)
+            if (previous and last_check and last_check[0] == process_id
+                    and check_time - last_check[1] < self.fd_check_interval):
+                open_files = previous["open_files"]
+                connections = previous["network_connections"]
+            else:
+                # Get open files (for security monitoring)
+                try:
+                    open_files = len(process.open_files())
+                except (psutil.AccessDenied, psutil.NoSuchProcess):
+                    open_files = 0
+                
+                # Get network connections
+                try:
+                    connections = len(process.connections())
+                except (psutil.AccessDenied, psutil.NoSuchProcess):
+                    connections = 0
+                self._fd_checked_at[user_id] = (process_id, check_time)
             
             monitoring_data = {
                 "user_id": user_id,
@@ -151,7 +251,7 @@ class SecurityManager:
                 "cpu_percent": cpu_percent,
                 "open_files": open_files,
                 "network_connections": connections,
-                "timestamp": os.time.time()
+                "timestamp": _now()
             }
             
             # Store monitoring data
@@ -174,52 +274,69 @@ class SecurityManager:
     def _check_resource_violations(self, user_id: int, monitoring_data: Dict[str, Any]) -> List[str]:
         """Check for resource limit violations."""
         violations = []
+        memory_mb = monitoring_data["memory_mb"]
+        cpu_percent = monitoring_data["cpu_percent"]
+        open_files = monitoring_data["open_files"]
+        connections = monitoring_data["network_connections"]
         
-        # Check memory limit (512 MB)
-        if monitoring_data["memory_mb"] > 512:
-            violations.append(f"Memory usage: {monitoring_data['memory_mb']:.1f}MB > 512MB")
+        # Check memory limit
+        if memory_mb > self.max_memory_mb:
+            violations.append(f"Memory usage: {memory_mb:.1f}MB > {self.max_memory_mb}MB")
         
-        # Check CPU limit (25%)
-        if monitoring_data["cpu_percent"] > 25:
-            violations.append(f"CPU usage: {monitoring_data['cpu_percent']:.1f}% > 25%")
+        # Check CPU limit
+        if cpu_percent > self.max_cpu_percent:
+            violations.append(f"CPU usage: {cpu_percent:.1f}% > {self.max_cpu_percent}%")
         
         # Check file handles (security concern)
-        if monitoring_data["open_files"] > 100:
-            violations.append(f"Too many open files: {monitoring_data['open_files']} > 100")
+        if open_files > self.max_open_files:
+            violations.append(f"Too many open files: {open_files} > {self.max_open_files}")
         
         # Check network connections (security concern)
-        if monitoring_data["network_connections"] > 50:
-            violations.append(f"Too many connections: {monitoring_data['network_connections']} > 50")
+        if connections > self.max_network_connections:
+            violations.append(f"Too many connections: {connections} > {self.max_network_connections}")
         
         return violations
     
     def cleanup_user_data(self, user_id: int, secure_delete: bool = True) -> bool:
         """Securely clean up user data."""
         try:
-            user_path = Path(f"user_instances/user_{user_id}")
+            user_path = _user_path(user_id)
             
             if not user_path.exists():
                 return True
             
-            if secure_delete:
-                # Secure deletion - overwrite files before deletion
-                for file_path in user_path.rglob("*"):
-                    if file_path.is_file():
-                        try:
-                            # Overwrite with random data
-                            file_size = file_path.stat().st_size
-                            with open(file_path, 'wb') as f:
-                                f.write(secrets.token_bytes(file_size))
-                        except Exception as e:
-                            logger.warning(f"Could not securely overwrite {file_path}: {e}")
+            self._delete_user_files(user_path, secure_delete)
             
-            # Remove directory
-            import shutil
-            shutil.rmtree(user_path)
+            # Remove from monitoring
+            if user_id in self.user_processes:
+                del self.user_processes[user_id]
+            self._fd_checked_at.pop(user_id, None)
+            
+            logger.info(f"Cleaned up user data for {user_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error cleaning up user data for {user_id}: {e}")
+            return False
+    
+    async def cleanup_user_data_async(self, user_id: int, secure_delete: bool = True) -> bool:
+        """Securely clean up user data without blocking the event loop."""
+        try:
+            user_path = _user_path(user_id)
+            
+            if not user_path.exists():
+                return True
+            
+            # Overwriting and fsyncing can take a while for large directories,
+            # so only the disk work runs in the default thread pool; monitoring
+            # state is shared with the event loop and is updated here
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._delete_user_files, user_path, secure_delete)
             
             # Remove from monitoring
             if user_id in self.user_processes:
                 del self.user_processes[user_id]
+            self._fd_checked_at.pop(user_id, None)
             
             logger.info(f"Cleaned up user data for {user_id}")
             return True
@@ -228,34 +345,74 @@ class SecurityManager:
             logger.error(f"Error cleaning up user data for {user_id}: {e}")
             return False
     
+    def _delete_user_files(self, user_path: Path, secure_delete: bool):
+        """Remove a user's directory from disk, overwriting files first if requested."""
+        if secure_delete:
+            # Secure deletion - overwrite files before deletion, reusing
+            # one block of kernel random data for every chunk
+            overwrite_data = memoryview(os.urandom(OVERWRITE_CHUNK_SIZE))
+            self._secure_delete_tree(user_path, overwrite_data)
+        else:
+            # Remove directory
+            shutil.rmtree(user_path)
+    
+    def _secure_delete_tree(self, directory, overwrite_data: memoryview):
+        """Overwrite and remove every file below a directory, then the directory itself.
+        
+        Files are unlinked right after they are overwritten, so the tree is
+        walked only once instead of again by shutil.rmtree.
+        """
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    self._secure_delete_tree(entry.path, overwrite_data)
+                    continue
+                
+                if entry.is_file(follow_symlinks=False):
+                    try:
+                        self._overwrite_file(entry.path, entry.stat(follow_symlinks=False).st_size, overwrite_data)
+                    except Exception as e:
+                        logger.warning(f"Could not securely overwrite {entry.path}: {e}")
+                os.unlink(entry.path)
+        os.rmdir(directory)
+    
+    def _overwrite_file(self, file_path: str, file_size: int, overwrite_data: memoryview):
+        """Overwrite a file in place, chunk by chunk, and flush it to disk."""
+        remaining = file_size
+        chunk_size = len(overwrite_data)
+        
+        # r+b keeps the existing blocks; truncating first would let the
+        # filesystem write the new data elsewhere
+        with open(file_path, 'r+b', buffering=0) as f:
+            while remaining > 0:
+                remaining -= f.write(overwrite_data[:min(remaining, chunk_size)])
+            os.fsync(f.fileno())
+    
     def audit_user_activity(self, user_id: int) -> Dict[str, Any]:
         """Audit user activity for security purposes."""
         try:
-            user_path = Path(f"user_instances/user_{user_id}")
+            user_path = _user_path(user_id)
             
             if not user_path.exists():
                 return {"error": "User path not found"}
             
-            # Check log files
-            log_files = list((user_path / "logs").glob("*.log"))
-            
-            # Check session files
-            session_files = list((user_path / "sessions").glob("*"))
-            
-            # Check data files
-            data_files = list((user_path / "data").glob("*"))
-            
-            # Get directory size
-            total_size = sum(f.stat().st_size for f in user_path.rglob("*") if f.is_file())
+            # Get directory size and last modification in a single walk
+            total_size = 0
+            last_modified = 0
+            for entry in _walk_files(user_path):
+                stat = entry.stat(follow_symlinks=False)
+                total_size += stat.st_size
+                if stat.st_mtime > last_modified:
+                    last_modified = stat.st_mtime
             
             audit_data = {
                 "user_id": user_id,
-                "log_files": len(log_files),
-                "session_files": len(session_files),
-                "data_files": len(data_files),
+                "log_files": _count_entries(user_path / "logs", ".log"),
+                "session_files": _count_entries(user_path / "sessions"),
+                "data_files": _count_entries(user_path / "data"),
                 "total_size_mb": total_size / 1024 / 1024,
-                "last_modified": max((f.stat().st_mtime for f in user_path.rglob("*") if f.is_file()), default=0),
-                "audit_timestamp": os.time.time()
+                "last_modified": last_modified,
+                "audit_timestamp": _now()
             }
             
             return audit_data
@@ -266,10 +423,18 @@ class SecurityManager:
     
     def get_security_status(self) -> Dict[str, Any]:
         """Get overall security status."""
+        # Aggregate in a single pass over the monitored processes
+        active_processes = 0
+        total_memory_usage = 0
+        for p in self.user_processes.values():
+            if p.get("is_running", False):
+                active_processes += 1
+            total_memory_usage += p.get("memory_mb", 0)
+        
         return {
             "total_monitored_users": len(self.user_processes),
-            "active_processes": sum(1 for p in self.user_processes.values() if p.get("is_running", False)),
-            "total_memory_usage": sum(p.get("memory_mb", 0) for p in self.user_processes.values()),
+            "active_processes": active_processes,
+            "total_memory_usage": total_memory_usage,
             "encryption_enabled": True,
             "isolation_enabled": True,
             "monitoring_active": True
@@ -287,10 +452,8 @@ class SecurityManager:
                 return False
             
             # Check for obviously fake credentials
-            fake_patterns = ["your_api", "example", "test", "fake", "demo"]
-            for pattern in fake_patterns:
-                if pattern in api_hash.lower():
-                    return False
+            if _FAKE_CRED_RE.search(api_hash):
+                return False
             
             return True
             
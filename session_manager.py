@@ -8,6 +8,7 @@ import asyncio
 import json
 import os
 import logging
+import sys
 from pathlib import Path
 from typing import Dict, Optional, Any
 from dataclasses import dataclass
@@ -17,7 +18,10 @@ import time
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Slotted dataclasses (no per-instance __dict__) need Python 3.10+
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
 class AuthSession:
     """Authentication session data."""
     user_id: int
@@ -36,19 +40,45 @@ class TelegramSessionManager:
     def __init__(self):
         self.active_sessions: Dict[int, AuthSession] = {}
         self.authenticated_clients: Dict[int, TelegramClient] = {}
+        self.max_concurrent_connects = 32  # Parallel connections when restoring sessions
     
     async def start_authentication(self, user_id: int, phone: str, api_id: int, api_hash: str) -> Dict[str, Any]:
         """Start Telegram authentication process."""
         try:
+            # A leftover client is only reusable with the same API credentials;
+            # otherwise it is replaced so the new session matches the client
+            client = self.authenticated_clients.get(user_id)
+            if client is not None and (client.api_id != int(api_id) or client.api_hash != api_hash):
+                logger.info(f"API credentials changed for user {user_id}, replacing client")
+                del self.authenticated_clients[user_id]
+                try:
+                    await client.disconnect()
+                except Exception as e:
+                    logger.warning(f"Error disconnecting previous client for user {user_id}: {e}")
+                client = None
+            
+            # Skip the connection round trip if this user finished signing in.
+            # Any other leftover client (pending or expired code) is reused
+            # below and is_user_authorized() decides whether to send a code.
+            auth_session = self.active_sessions.get(user_id)
+            if client is not None and auth_session is not None and auth_session.status == "authenticated":
+                logger.info(f"User {user_id} already authenticated")
+                return {
+                    "success": True,
+                    "status": "already_authenticated",
+                    "message": "User is already authenticated"
+                }
+            
             # Create session file path
             session_dir = Path(f"user_instances/user_{user_id}/sessions")
-            session_dir.mkdir(parents=True, exist_ok=True)
             session_file = str(session_dir / "telegram_session")
             
-            # Create Telegram client
-            client = TelegramClient(session_file, api_id, api_hash)
+            if client is None:
+                # Create Telegram client
+                session_dir.mkdir(parents=True, exist_ok=True)
+                client = TelegramClient(session_file, api_id, api_hash)
             
-            # Connect to Telegram
+            # Connect to Telegram (a no-op for a client from an earlier attempt)
             await client.connect()
             
             # Check if already authenticated
@@ -65,6 +95,7 @@ class TelegramSessionManager:
             sent_code = await client.send_code_request(phone)
             
             # Create auth session
+            now = time.time()
             auth_session = AuthSession(
                 user_id=user_id,
                 phone=phone,
@@ -73,8 +104,8 @@ class TelegramSessionManager:
                 session_file=session_file,
                 status="code_sent",
                 code_hash=sent_code.phone_code_hash,
-                created_at=time.time(),
-                expires_at=time.time() + 300  # 5 minutes
+                created_at=now,
+                expires_at=now + 300  # 5 minutes
             )
             
             self.active_sessions[user_id] = auth_session
@@ -247,23 +278,23 @@ class TelegramSessionManager:
                 "status": "no_session"
             }
         
+        expires_at = auth_session.expires_at
         return {
             "exists": True,
             "status": auth_session.status,
             "phone": auth_session.phone,
             "created_at": auth_session.created_at,
-            "expires_at": auth_session.expires_at,
-            "time_remaining": max(0, auth_session.expires_at - time.time())
+            "expires_at": expires_at,
+            "time_remaining": max(0, expires_at - time.time())
         }
     
     async def cleanup_expired_sessions(self):
         """Clean up expired authentication sessions."""
         current_time = time.time()
-        expired_users = []
-        
-        for user_id, session in self.active_sessions.items():
-            if current_time > session.expires_at and session.status != "authenticated":
-                expired_users.append(user_id)
+        expired_users = [
+            user_id for user_id, session in self.active_sessions.items()
+            if current_time > session.expires_at and session.status != "authenticated"
+        ]
         
         for user_id in expired_users:
             await self.disconnect_user(user_id)
@@ -276,6 +307,9 @@ class TelegramSessionManager:
             if not user_instances_dir.exists():
                 return
             
+            # Read credentials up front (small local files), so the concurrent
+            # phase below only waits on Telegram
+            pending_sessions = []
             for user_dir in user_instances_dir.iterdir():
                 if not user_dir.is_dir() or not user_dir.name.startswith("user_"):
                     continue
@@ -283,53 +317,71 @@ class TelegramSessionManager:
                 try:
                     user_id = int(user_dir.name.split("_")[1])
                     session_file = user_dir / "sessions" / "telegram_session.session"
+                    config_file = user_dir / ".env"
+                    
+                    if not session_file.exists() or not config_file.exists():
+                        continue
                     
-                    if session_file.exists():
-                        # Try to load existing session
-                        config_file = user_dir / ".env"
-                        if config_file.exists():
-                            # Parse config to get API credentials
-                            config = {}
-                            with open(config_file, 'r') as f:
-                                for line in f:
-                                    if '=' in line and not line.startswith('#'):
-                                        key, value = line.strip().split('=', 1)
-                                        config[key] = value
-                            
-                            api_id = int(config.get('TELEGRAM_API_ID', 0))
-                            api_hash = config.get('TELEGRAM_API_HASH', '')
-                            phone = config.get('TELEGRAM_PHONE', '')
-                            
-                            if api_id and api_hash:
-                                # Create client and check if authenticated
-                                client = TelegramClient(str(session_file).replace('.session', ''), api_id, api_hash)
-                                await client.connect()
-                                
-                                if await client.is_user_authorized():
-                                    self.authenticated_clients[user_id] = client
-                                    
-                                    # Create auth session record
-                                    auth_session = AuthSession(
-                                        user_id=user_id,
-                                        phone=phone,
-                                        api_id=api_id,
-                                        api_hash=api_hash,
-                                        session_file=str(session_file).replace('.session', ''),
-                                        status="authenticated",
-                                        created_at=time.time()
-                                    )
-                                    self.active_sessions[user_id] = auth_session
-                                    
-                                    logger.info(f"Loaded existing session for user {user_id}")
-                                else:
-                                    await client.disconnect()
+                    # Parse config to get API credentials
+                    config = {}
+                    for line in config_file.read_text().splitlines():
+                        key, sep, value = line.partition('=')
+                        if sep and not key.startswith('#'):
+                            config[key.strip()] = value.strip()
+                    
+                    api_id = int(config.get('TELEGRAM_API_ID', 0))
+                    api_hash = config.get('TELEGRAM_API_HASH', '')
+                    phone = config.get('TELEGRAM_PHONE', '')
+                    
+                    if api_id and api_hash:
+                        pending_sessions.append((
+                            user_dir.name, user_id, str(session_file).replace('.session', ''),
+                            api_id, api_hash, phone
+                        ))
                 
                 except Exception as e:
                     logger.warning(f"Error loading session for {user_dir.name}: {e}")
                     continue
+            
+            # Connect to Telegram concurrently, with a bounded number in flight
+            semaphore = asyncio.Semaphore(self.max_concurrent_connects)
+            await asyncio.gather(*(
+                self._load_session(semaphore, *session_args) for session_args in pending_sessions
+            ))
         
         except Exception as e:
             logger.error(f"Error loading existing sessions: {e}")
+    
+    async def _load_session(self, semaphore: asyncio.Semaphore, dir_name: str, user_id: int,
+                            session_file: str, api_id: int, api_hash: str, phone: str):
+        """Connect a stored session and keep it if it is still authorized."""
+        async with semaphore:
+            try:
+                # Create client and check if authenticated
+                client = TelegramClient(session_file, api_id, api_hash)
+                await client.connect()
+                
+                if await client.is_user_authorized():
+                    self.authenticated_clients[user_id] = client
+                    
+                    # Create auth session record
+                    auth_session = AuthSession(
+                        user_id=user_id,
+                        phone=phone,
+                        api_id=api_id,
+                        api_hash=api_hash,
+                        session_file=session_file,
+                        status="authenticated",
+                        created_at=time.time()
+                    )
+                    self.active_sessions[user_id] = auth_session
+                    
+                    logger.info(f"Loaded existing session for user {user_id}")
+                else:
+                    await client.disconnect()
+            
+            except Exception as e:
+                logger.warning(f"Error loading session for {dir_name}: {e}")
 
 # Global session manager instance
 session_manager = TelegramSessionManager()
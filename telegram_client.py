@@ -1,5 +1,4 @@
 import asyncio
-import re
 from typing import Optional, Callable, Any
 from telethon import TelegramClient, events
 from telethon.tl.types import Message
@@ -23,28 +22,25 @@ class TelegramBotClient:
             Config.TELEGRAM_API_HASH
         )
         self.message_handler = message_handler
-        # Patterns for all command types
-        self.command_pattern = re.compile(
-            rf'^{re.escape(Config.BOT_COMMAND_PREFIX)}\s+(.+)$',
-            re.IGNORECASE | re.DOTALL
-        )
-        self.answer_pattern = re.compile(
-            rf'^{re.escape(Config.BOT_ANSWER_PREFIX)}(?:\s+.*)?$',
-            re.IGNORECASE | re.DOTALL
-        )
-        self.auto_answer_pattern = re.compile(
-            rf'^{re.escape(Config.BOT_AUTO_ANSWER_PREFIX)}(?:\s+.*)?$',
-            re.IGNORECASE | re.DOTALL
-        )
-        self.manual_answer_pattern = re.compile(
-            rf'^{re.escape(Config.BOT_MANUAL_ANSWER_PREFIX)}(?:\s+.*)?$',
-            re.IGNORECASE | re.DOTALL
-        )
-        self.preference_pattern = re.compile(
-            rf'^{re.escape(Config.BOT_PREFERENCE_PREFIX)}(?:\s+.*)?$',
-            re.IGNORECASE | re.DOTALL
-        )
         
+    @property
+    def message_handler(self) -> Optional[Any]:
+        """Handler for detected commands and incoming messages."""
+        return self._message_handler
+    
+    @message_handler.setter
+    def message_handler(self, message_handler: Optional[Any]):
+        self._message_handler = message_handler
+        # Resolve the command callback and the incoming-message hook once
+        # instead of on every message
+        if not message_handler:
+            self._outgoing_handler = None
+        elif callable(message_handler):
+            self._outgoing_handler = message_handler
+        else:
+            self._outgoing_handler = message_handler.handle_message
+        self._incoming_handler = getattr(message_handler, 'handle_incoming_message', None)
+    
     async def start(self) -> bool:
         """Start the Telegram client and authenticate."""
         try:
@@ -53,7 +49,7 @@ class TelegramBotClient:
             
             # Verify authentication
             me = await self.client.get_me()
-            logger.info(f"Successfully authenticated as {me.first_name} (@{me.username})")
+            logger.info("Successfully authenticated as %s (@%s)", me.first_name, me.username)
             
             # Register event handlers
             self._register_handlers()
@@ -61,7 +57,7 @@ class TelegramBotClient:
             return True
             
         except Exception as e:
-            logger.error(f"Failed to start Telegram client: {e}")
+            logger.error("Failed to start Telegram client: %s", e)
             return False
     
     async def stop(self):
@@ -71,7 +67,7 @@ class TelegramBotClient:
             await self.client.disconnect()
             logger.info("Telegram client stopped")
         except Exception as e:
-            logger.error(f"Error stopping Telegram client: {e}")
+            logger.error("Error stopping Telegram client: %s", e)
     
     def _register_handlers(self):
         """Register event handlers for message monitoring."""
@@ -84,96 +80,65 @@ class TelegramBotClient:
                 if not message_text:
                     return
                 
-                # Check if message matches command patterns
-                command_match = self.command_pattern.match(message_text.strip())
-                answer_match = self.answer_pattern.match(message_text.strip())
-                auto_answer_match = self.auto_answer_pattern.match(message_text.strip())
-                manual_answer_match = self.manual_answer_pattern.match(message_text.strip())
-                preference_match = self.preference_pattern.match(message_text.strip())
+                # Messages shorter than any prefix, or starting with a character
+                # no prefix starts with, cannot be commands
+                stripped = message_text.strip()
+                if (len(stripped) < Config.MIN_COMMAND_PREFIX_LENGTH
+                        or stripped[:1].lower() not in Config.COMMAND_PREFIX_INITIALS):
+                    return
+                
+                # Check if message matches any command pattern
+                command_match = Config.COMMAND_PATTERN.match(stripped.lower())
+                if not command_match:
+                    return
+                command_type = command_match.lastgroup
 
-                if command_match:
-                    question = command_match.group(1).strip()
+                # Only the question command passes text; for the others the
+                # handler reads what it needs from the event
+                question = ""
+                if command_type == "question":
+                    question = stripped[command_match.start("question_text"):].strip()
 
                     if len(question) > Config.MAX_QUESTION_LENGTH:
-                        logger.warning(f"Question too long ({len(question)} chars), skipping")
+                        logger.warning("Question too long (%s chars), skipping", len(question))
                         return
 
-                    logger.info(f"Detected .ascl command with question: {question[:50]}...")
+                    logger.info("Detected %s command with question: %s...",
+                                Config.COMMAND_PREFIXES[command_type], question[:50])
+                else:
+                    logger.info("Detected %s command", Config.COMMAND_PREFIXES[command_type])
 
-                    # Call the message handler if provided
-                    if self.message_handler:
-                        if callable(self.message_handler):
-                            await self.message_handler(event, question)
-                        else:
-                            await self.message_handler.handle_message(event, question)
-
-                elif answer_match:
-                    logger.info("Detected .ans command")
-
-                    # Call the message handler with empty question for .ans command
-                    if self.message_handler:
-                        if callable(self.message_handler):
-                            await self.message_handler(event, "")
-                        else:
-                            await self.message_handler.handle_message(event, "")
-
-                elif auto_answer_match:
-                    logger.info("Detected .aans command")
-
-                    # Call the message handler for auto-answer command
-                    if self.message_handler:
-                        if callable(self.message_handler):
-                            await self.message_handler(event, "")
-                        else:
-                            await self.message_handler.handle_message(event, "")
-
-                elif manual_answer_match:
-                    logger.info("Detected .mans command")
-
-                    # Call the message handler for manual-answer command
-                    if self.message_handler:
-                        if callable(self.message_handler):
-                            await self.message_handler(event, "")
-                        else:
-                            await self.message_handler.handle_message(event, "")
-
-                elif preference_match:
-                    logger.info("Detected .pref command")
-
-                    # Call the message handler for preference command
-                    if self.message_handler:
-                        if callable(self.message_handler):
-                            await self.message_handler(event, "")
-                        else:
-                            await self.message_handler.handle_message(event, "")
+                # Call the message handler if provided
+                if self._outgoing_handler:
+                    await self._outgoing_handler(event, question)
                         
             except Exception as e:
-                logger.error(f"Error handling outgoing message: {e}")
+                logger.error("Error handling outgoing message: %s", e)
 
         @self.client.on(events.NewMessage(incoming=True))
         async def handle_incoming_message(event):
             """Handle incoming messages for potential auto-response and command blocking."""
             try:
-                message_text = event.message.message
+                message = event.message
+                message_text = message.message
                 if not message_text:
                     return
 
                 # Check if non-owner is trying to use bot commands
                 if self._is_bot_command(message_text):
-                    logger.warning(f"Non-owner user {event.message.sender_id} attempted to use bot command: {message_text[:20]}...")
+                    logger.warning("Non-owner user %s attempted to use bot command: %s...", message.sender_id, message_text[:20])
                     # Silently ignore - don't respond to prevent revealing bot presence
                     return
 
-                # Only process if we have a message handler
-                if not self.message_handler:
+                # Only process if the message handler accepts incoming messages
+                if self._incoming_handler is None:
                     return
 
                 # Let the message handler decide if this should trigger an auto-response
-                if hasattr(self.message_handler, 'handle_incoming_message'):
-                    await self.message_handler.handle_incoming_message(event)
+                await self._incoming_handler(event)
 
             except Exception as e:
-                logger.error(f"Error handling incoming message: {e}")
+                logger.error("Error handling incoming message: %s", e)
 
     def _is_bot_command(self, message_text: str) -> bool:
         """Check if a message is a bot command.
@@ -187,12 +152,12 @@ class TelegramBotClient:
         if not message_text:
             return False
 
-        text_lower = message_text.strip().lower()
-        return (text_lower.startswith(Config.BOT_COMMAND_PREFIX.lower()) or
-                text_lower.startswith(Config.BOT_ANSWER_PREFIX.lower()) or
-                text_lower.startswith(Config.BOT_AUTO_ANSWER_PREFIX.lower()) or
-                text_lower.startswith(Config.BOT_MANUAL_ANSWER_PREFIX.lower()) or
-                text_lower.startswith(Config.BOT_PREFERENCE_PREFIX.lower()))
+        # Check the first character before lowercasing anything, and only
+        # lowercase as much text as the longest prefix needs
+        text = message_text.lstrip()
+        if len(text) < Config.MIN_COMMAND_PREFIX_LENGTH or text[:1].lower() not in Config.COMMAND_PREFIX_INITIALS:
+            return False
+        return text[:Config.MAX_COMMAND_PREFIX_LENGTH].lower().startswith(Config.COMMAND_PREFIXES_LOWER)
     
     async def replace_message(self, original_message: Message, new_text: str) -> bool:
         """Replace an original message with new text.
@@ -220,7 +185,7 @@ class TelegramBotClient:
             return True
             
         except Exception as e:
-            logger.error(f"Failed to replace message: {e}")
+            logger.error("Failed to replace message: %s", e)
             return False
     
     async def run_until_disconnected(self):
@@ -231,6 +196,6 @@ class TelegramBotClient:
         except KeyboardInterrupt:
             logger.info("Received interrupt signal")
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
         finally:
             await self.stop()
@@ -1,6 +1,7 @@
 import asyncio
 import random
 import re
+from dataclasses import dataclass
 from typing import Optional
 from telethon.tl.functions.messages import SetTypingRequest
 from telethon.tl.types import SendMessageTypingAction
@@ -9,6 +10,38 @@ from logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Typing actions carry no state, so one instance is shared by every request
+_TYPING_ACTION = SendMessageTypingAction()
+
+_WORD_RE = re.compile(r'\b\w+\b')
+
+# Maps every ASCII character that is not a word character to a space
+_NON_WORD_TO_SPACE = str.maketrans({
+    char: ' ' for char in map(chr, range(128)) if not (char.isalnum() or char == '_')
+})
+
+def _count_words(text: str) -> int:
+    """Count the words in a text, as matched by ``_WORD_RE``.
+    
+    ASCII text is split in C after mapping non-word characters to spaces,
+    which avoids the regex engine. Other text falls back to the regex,
+    since Unicode word characters are not covered by the table.
+    """
+    if text.isascii():
+        return len(text.translate(_NON_WORD_TO_SPACE).split())
+    return len(_WORD_RE.findall(text))
+
+@dataclass
+class TypingStats:
+    """Typing statistics for a text."""
+    __slots__ = ('words', 'characters', 'estimated_time', 'wpm', 'effective_wpm')
+
+    words: int
+    characters: int
+    estimated_time: float
+    wpm: float
+    effective_wpm: float
+
 class TypingSimulator:
     """Simulates realistic human typing behavior for Telegram messages."""
     
@@ -19,41 +52,52 @@ class TypingSimulator:
         self.max_delay = Config.TYPING_MAX_DELAY
         self.variation = Config.TYPING_VARIATION
         self.pause_chance = Config.TYPING_PAUSE_CHANCE
+        self.typing_action_duration = 5.0  # Telegram shows a typing action for ~5 seconds
+        self.rng = random.Random()  # Own generator, independent of the global random state
         
-    def calculate_typing_time(self, text: str) -> float:
+    def calculate_typing_time(self, text: str, words: Optional[int] = None) -> float:
         """Calculate realistic typing time for a given text.
         
         Args:
             text: The text that will be "typed"
+            words: Word count of the text, if the caller already has it
             
         Returns:
             float: Typing time in seconds
         """
         try:
             # Count words (approximate)
-            words = len(re.findall(r'\b\w+\b', text))
+            if words is None:
+                words = _count_words(text)
             
             # Base typing time (words per minute to seconds)
             base_time = (words / self.wpm) * 60
             
             # Add variation to simulate human inconsistency
-            variation_factor = 1 + random.uniform(-self.variation, self.variation)
+            rng_random = self.rng.random
+            variation = self.variation
+            variation_factor = 1 + variation * (2 * rng_random() - 1)
             typing_time = base_time * variation_factor
             
-            # Add thinking pauses for longer messages
-            if words > 10 and random.random() < self.pause_chance:
-                thinking_pause = random.uniform(1, 3)
-                typing_time += thinking_pause
-                logger.debug(f"Added thinking pause: {thinking_pause:.1f}s")
+            # Add thinking pauses for longer messages. A draw below
+            # pause_chance is uniform on [0, pause_chance), so rescaling it
+            # gives the pause length without drawing again.
+            if words > 10:
+                pause_chance = self.pause_chance
+                pause_draw = rng_random()
+                if pause_draw < pause_chance:
+                    thinking_pause = 1 + 2 * (pause_draw / pause_chance)
+                    typing_time += thinking_pause
+                    logger.debug("Added thinking pause: %.1fs", thinking_pause)
             
             # Ensure within reasonable bounds
             typing_time = max(self.min_delay, min(typing_time, self.max_delay))
             
-            logger.debug(f"Calculated typing time: {typing_time:.1f}s for {words} words")
+            logger.debug("Calculated typing time: %.1fs for %s words", typing_time, words)
             return typing_time
             
         except Exception as e:
-            logger.warning(f"Error calculating typing time: {e}")
+            logger.warning("Error calculating typing time: %s", e)
             return self.min_delay
     
     async def simulate_typing(self, client, chat_entity, text: str) -> None:
@@ -70,10 +114,16 @@ class TypingSimulator:
             # Start typing animation
             await client(SetTypingRequest(
                 peer=chat_entity,
-                action=SendMessageTypingAction()
+                action=_TYPING_ACTION
             ))
             logger.debug("Started typing animation")
             
+            # A single request keeps the animation visible for short messages
+            if typing_time <= self.typing_action_duration:
+                await asyncio.sleep(typing_time)
+                logger.debug("Completed typing simulation (%.1fs)", typing_time)
+                return
+            
             # Simulate typing with periodic animation updates
             elapsed = 0
             update_interval = 3  # Update typing animation every 3 seconds
@@ -87,14 +137,14 @@ class TypingSimulator:
                 if elapsed < typing_time:
                     await client(SetTypingRequest(
                         peer=chat_entity,
-                        action=SendMessageTypingAction()
+                        action=_TYPING_ACTION
                     ))
                     logger.debug("Refreshed typing animation")
             
-            logger.debug(f"Completed typing simulation ({typing_time:.1f}s)")
+            logger.debug("Completed typing simulation (%.1fs)", typing_time)
             
         except Exception as e:
-            logger.warning(f"Error during typing simulation: {e}")
+            logger.warning("Error during typing simulation: %s", e)
             # Fallback to minimum delay without animation
             await asyncio.sleep(self.min_delay)
     
@@ -110,9 +160,9 @@ class TypingSimulator:
             # Start typing animation
             await client(SetTypingRequest(
                 peer=chat_entity,
-                action=SendMessageTypingAction()
+                action=_TYPING_ACTION
             ))
-            logger.debug(f"Started quick typing animation ({duration}s)")
+            logger.debug("Started quick typing animation (%ss)", duration)
             
             # Wait for the specified duration
             await asyncio.sleep(duration)
@@ -120,41 +170,41 @@ class TypingSimulator:
             logger.debug("Completed quick typing simulation")
             
         except Exception as e:
-            logger.warning(f"Error during quick typing simulation: {e}")
+            logger.warning("Error during quick typing simulation: %s", e)
             # Fallback to simple delay
             await asyncio.sleep(min(duration, 1.0))
     
-    def get_typing_stats(self, text: str) -> dict:
+    def get_typing_stats(self, text: str) -> TypingStats:
         """Get typing statistics for a text.
         
         Args:
             text: Text to analyze
             
         Returns:
-            dict: Typing statistics
+            TypingStats: Typing statistics
         """
         try:
-            words = len(re.findall(r'\b\w+\b', text))
+            words = _count_words(text)
             chars = len(text)
-            typing_time = self.calculate_typing_time(text)
+            typing_time = self.calculate_typing_time(text, words)
             
-            return {
-                'words': words,
-                'characters': chars,
-                'estimated_time': typing_time,
-                'wpm': self.wpm,
-                'effective_wpm': (words / typing_time * 60) if typing_time > 0 else 0
-            }
+            return TypingStats(
+                words=words,
+                characters=chars,
+                estimated_time=typing_time,
+                wpm=self.wpm,
+                effective_wpm=(words / typing_time * 60) if typing_time > 0 else 0
+            )
             
         except Exception as e:
-            logger.warning(f"Error getting typing stats: {e}")
-            return {
-                'words': 0,
-                'characters': len(text) if text else 0,
-                'estimated_time': self.min_delay,
-                'wpm': self.wpm,
-                'effective_wpm': 0
-            }
+            logger.warning("Error getting typing stats: %s", e)
+            return TypingStats(
+                words=0,
+                characters=len(text) if text else 0,
+                estimated_time=self.min_delay,
+                wpm=self.wpm,
+                effective_wpm=0
+            )
 
 # Global typing simulator instance
 typing_simulator = TypingSimulator()